@@ -4,10 +4,16 @@ from openai import OpenAI
 
 load_dotenv()
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 class Settings:
     PROJECT_NAME: str = "BPMN Generator API"
     PROJECT_VERSION: str = "1.0.0"
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
+    EXAMPLE_INDEX_ENABLED: bool = os.getenv("EXAMPLE_INDEX_ENABLED", "false").lower() == "true"
+    # Relative paths are resolved against the project root, not the working directory
+    EXAMPLE_INDEX_PATH: str = os.path.join(PROJECT_ROOT, os.getenv("EXAMPLE_INDEX_PATH", "data/example_index.json"))
+    EXAMPLE_INDEX_MAX_SIZE: int = int(os.getenv("EXAMPLE_INDEX_MAX_SIZE", "1000"))
     
     @property
     def openai_client(self):
@@ -1,5 +1,5 @@
 from typing import Optional, List
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException
 from pydantic import BaseModel
 from openai import OpenAI
 import json
@@ -10,6 +10,8 @@ from .natural_language_processor import process_text, build_system_prompt, proce
 from .prompt_analyzer import analyze_prompt
 from .intermediary_notation_generator import generate_intermediary_notation
 from .bpmn_xml_generator import BPMNXMLGenerator
+from .layout_geometry import resolve_layout_collisions
+from .example_index import example_index
 
 class ChatMessage(BaseModel):
     role: str
@@ -32,12 +34,45 @@ class BPMNGeneratorService:
             nlp_result = process_text(prompt)
             intermediary = generate_intermediary_notation(nlp_result)
             xml_generator = BPMNXMLGenerator()
-            return xml_generator.generate_bpmn_xml(intermediary)
+            bpmn_xml = resolve_layout_collisions(xml_generator.generate_bpmn_xml(intermediary))
             
         except Exception as e:
             logger.error(f"Failed to generate new BPMN: {str(e)}")
             raise
         
+        self._remember_example(prompt, intermediary, bpmn_xml)
+        return bpmn_xml
+    
+    def _remember_example(self, prompt: str, intermediary: dict, bpmn_xml: str) -> None:
+        """Hold a successful generation until a follow-up confirms it"""
+        if settings.EXAMPLE_INDEX_ENABLED:
+            example_index.propose(prompt, intermediary, bpmn_xml)
+
+    def confirm_example(self, prompt: str, chat_history: list, existing_bpmn: Optional[str] = None) -> bool:
+        """Index the generation a follow-up accepted, returning True if the index changed.
+
+        The generation is found by the XML the follow-up sends back, or else
+        by the last user message before the follow-up's own prompt, which
+        clients may already have appended to the history.
+        """
+        prompts = [message.content for message in chat_history if message.role == "user"]
+        while prompts and prompts[-1] == prompt:
+            prompts.pop()
+        candidates = [example_index.proposed_prompt(existing_bpmn) if existing_bpmn else None] + prompts[-1:]
+        if not any(example_index.confirm(candidate) for candidate in candidates if candidate):
+            return False
+        logger.debug("Stored confirmed few-shot example")
+        return True
+
+    def save_examples(self) -> None:
+        """Write the example index to disk if it changed since the last save"""
+        if not example_index.dirty:
+            return
+        try:
+            example_index.save()
+        except Exception as e:
+            logger.warning(f"Failed to save few-shot examples: {str(e)}")
+        
     def update_layout(self, prompt: str, existing_bpmn: str, chat_history: list, is_beautification: bool = False) -> str:
         """Update only the layout of existing BPMN XML"""
         logger.debug("\n=== Starting Layout Update ===")
@@ -57,17 +92,18 @@ class BPMNGeneratorService:
     def generate_or_update_bpmn(self, prompt: str, chat_history: list, existing_bpmn: str = None, is_beautification: bool = False) -> str:
         """Generate new BPMN or update existing one based on parameters"""
         if existing_bpmn:
-            return self.update_layout(
+            bpmn_xml = self.update_layout(
                 prompt=prompt,
                 existing_bpmn=existing_bpmn,
                 chat_history=chat_history,
                 is_beautification=is_beautification
             )
-        else:
-            return self.generate_new_bpmn(
-                prompt=prompt,
-                chat_history=chat_history
-            )
+            return resolve_layout_collisions(bpmn_xml)
+        # New generations are laid out before they are remembered, so follow-ups can match the XML they send back
+        return self.generate_new_bpmn(
+            prompt=prompt,
+            chat_history=chat_history
+        )
 
 # Singleton instance
 bpmn_service = BPMNGeneratorService()
@@ -75,7 +111,7 @@ bpmn_service = BPMNGeneratorService()
 router = APIRouter(prefix="/api")
 
 @router.post("/bpmn")
-async def handle_bpmn_request(request: BPMNRequest):
+async def handle_bpmn_request(request: BPMNRequest, background_tasks: BackgroundTasks):
     try:
         logger.debug("\n=== New BPMN Request ===")
         logger.debug(f"Request Prompt: {request.prompt}")
@@ -86,6 +122,12 @@ async def handle_bpmn_request(request: BPMNRequest):
         analysis = analyze_prompt(request.prompt, request.chat_history)
         logger.debug(f"Prompt Analysis Result:\n{json.dumps(analysis, indent=2)}")
         
+        # A follow-up that leaves the workflow alone accepts the previous generation
+        if analysis["update_type"] in ("layout", "general") and analysis.get("sentiment") != "negative":
+            if bpmn_service.confirm_example(request.prompt, request.chat_history, request.existing_bpmn_xml):
+                # Saves run after the response in the threadpool, queued saves collapse into one write
+                background_tasks.add_task(bpmn_service.save_examples)
+        
         if analysis["update_type"] == "layout":
             logger.debug("\n=== Handling Layout Update ===")
             if not request.existing_bpmn_xml:
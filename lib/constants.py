@@ -46,5 +46,6 @@ LAYOUT_SETTINGS = {
     'element_width': 100,
     'element_height': 80,
     'horizontal_spacing': 150,
-    'vertical_spacing': 100
+    'vertical_spacing': 100,
+    'min_element_gap': 20
 } 
\ No newline at end of file
@@ -0,0 +1,210 @@
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+import numpy as np
+from core.config import settings
+from core.logger import logger
+
+# Size of the hashed feature space, collisions are rare well past 100k distinct n-grams
+HASH_DIMENSIONS = 2 ** 20
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Generations waiting for a follow-up to confirm them, oldest dropped first
+MAX_CANDIDATES = 100
+
+def vectorize(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Hash word unigrams and bigrams into a sparse, L2 normalised vector.
+
+    Returns the sorted feature indices and their weights.
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    ngrams = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+    if not ngrams:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    hashed = np.fromiter((zlib.crc32(ngram.encode('utf-8')) % HASH_DIMENSIONS for ngram in ngrams), dtype=np.int64)
+    features, counts = np.unique(hashed, return_counts=True)
+    weights = 1.0 + np.log(counts)
+    return features, weights / np.linalg.norm(weights)
+
+def _digest(output: str) -> str:
+    """Key generated XML by content, ignoring whitespace clients add around it"""
+    return hashlib.sha1(output.strip().encode('utf-8')).hexdigest()
+
+class ExampleIndex:
+    """Retrieval index over confirmed prompt to intermediary notation pairs.
+
+    Vectors are kept as flat (row, feature, weight) arrays so a lookup is a
+    single vectorised pass. Query terms are weighted by inverse document
+    frequency, computed at query time so incremental adds need no rebuild.
+    Once max_size examples are held the oldest are evicted first. An index
+    with a path reads it on first use rather than on construction.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: Optional[int] = None):
+        self.path = path
+        self.max_size = max_size
+        self.dirty = False
+        # add runs on the event loop while save runs on the threadpool
+        self._lock = threading.Lock()
+        self._loaded = path is None
+        self.examples: List[Dict[str, Any]] = []
+        self._prompts = set()
+        self._rows = np.empty(0, dtype=np.int64)
+        self._features = np.empty(0, dtype=np.int64)
+        self._weights = np.empty(0)
+        self._pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._candidates: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._outputs: 'OrderedDict[str, str]' = OrderedDict()
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self.examples)
+
+    def _load(self) -> None:
+        """Read the examples at path the first time the index is used"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                examples = json.load(f)
+            for example in examples[-self.max_size:] if self.max_size else examples:
+                self.add(example['prompt'], example['intermediary'])
+            self.dirty = False
+            logger.debug(f"Loaded {len(self.examples)} examples from {self.path}")
+        except Exception as e:
+            logger.warning(f"Failed to load example index from {self.path}: {str(e)}")
+
+    def add(self, prompt: str, intermediary: Dict[str, Any]) -> bool:
+        """Add an example, returning False if the prompt is already indexed"""
+        self._load()
+        if prompt in self._prompts:
+            return False
+
+        features, weights = vectorize(prompt)
+        self._pending.append((np.full(len(features), len(self.examples), dtype=np.int64), features, weights))
+        self._prompts.add(prompt)
+        with self._lock:
+            self.examples.append({'prompt': prompt, 'intermediary': intermediary})
+            self.dirty = True
+        if self.max_size is not None and len(self.examples) > self.max_size:
+            self._evict(len(self.examples) - self.max_size)
+        return True
+
+    def _evict(self, count: int) -> None:
+        """Drop the oldest examples and renumber the vectors of the rest"""
+        self._flush()
+        for example in self.examples[:count]:
+            self._prompts.discard(example['prompt'])
+        self.examples = self.examples[count:]
+        keep = self._rows >= count
+        self._rows = self._rows[keep] - count
+        self._features = self._features[keep]
+        self._weights = self._weights[keep]
+
+    def propose(self, prompt: str, intermediary: Dict[str, Any], output: Optional[str] = None) -> None:
+        """Hold a generation back from the index until it is confirmed, remembering the XML it produced"""
+        self._candidates[prompt] = intermediary
+        self._candidates.move_to_end(prompt)
+        while len(self._candidates) > MAX_CANDIDATES:
+            self._candidates.popitem(last=False)
+        if output:
+            self._outputs[_digest(output)] = prompt
+            self._outputs.move_to_end(_digest(output))
+            while len(self._outputs) > MAX_CANDIDATES:
+                self._outputs.popitem(last=False)
+
+    def proposed_prompt(self, output: str) -> Optional[str]:
+        """Return the prompt of the proposed generation that produced this XML, if any"""
+        return self._outputs.get(_digest(output))
+
+    def confirm(self, prompt: str) -> bool:
+        """Index a proposed generation, returning False if none was waiting or it is already indexed"""
+        intermediary = self._candidates.pop(prompt, None)
+        return intermediary is not None and self.add(prompt, intermediary)
+
+    def _flush(self) -> None:
+        """Merge vectors added since the last search into the flat arrays"""
+        if not self._pending:
+            return
+        rows, features, weights = zip(*self._pending)
+        self._rows = np.concatenate([self._rows, *rows])
+        self._features = np.concatenate([self._features, *features])
+        self._weights = np.concatenate([self._weights, *weights])
+        self._pending = []
+
+    def search(self, prompt: str, k: int = 2, min_score: float = 0.2) -> List[Dict[str, Any]]:
+        """Return up to k examples most similar to the prompt, best first"""
+        self._load()
+        query_features, query_weights = vectorize(prompt)
+        if not len(self.examples) or not len(query_features):
+            return []
+
+        self._flush()
+        matched = np.isin(self._features, query_features)
+        positions = np.searchsorted(query_features, self._features[matched])
+        frequency = np.bincount(positions, minlength=len(query_features))
+        idf = np.log((1 + len(self.examples)) / (1 + frequency)) + 1
+        query_weights = query_weights * idf
+        query_weights /= np.linalg.norm(query_weights)
+
+        scores = np.zeros(len(self.examples))
+        np.add.at(scores, self._rows[matched], self._weights[matched] * query_weights[positions])
+
+        best = np.argsort(-scores, kind='stable')[:k]
+        return [
+            {**self.examples[i], 'score': float(scores[i])}
+            for i in best if scores[i] >= min_score
+        ]
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Write the examples to disk, vectors are rebuilt on load.
+
+        Examples added while the file is written stay marked unsaved, as do
+        all of them if the write fails.
+        """
+        path = path or self.path
+        if not path:
+            raise ValueError("No path given to save the example index to")
+        self._load()
+        with self._lock:
+            examples = list(self.examples)
+            self.dirty = False
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(examples, f)
+            os.replace(temp_path, path)
+        except Exception:
+            # Leave the examples marked unsaved so the next save retries
+            self.dirty = True
+            raise
+
+    @classmethod
+    def load(cls, path: str, max_size: Optional[int] = None) -> 'ExampleIndex':
+        """Load an index from disk, starting empty if the file is missing or unreadable"""
+        index = cls(path, max_size)
+        index._load()
+        return index
+
+def format_examples(examples: List[Dict[str, Any]]) -> str:
+    """Render retrieved examples as compact few-shot context"""
+    return "\n".join(
+        f"Description: {example['prompt']}\nOutput: {json.dumps(example['intermediary'], separators=(',', ':'))}"
+        for example in examples
+    )
+
+# Singleton instance, the file is only read once the index is first used
+example_index = ExampleIndex(settings.EXAMPLE_INDEX_PATH, settings.EXAMPLE_INDEX_MAX_SIZE)
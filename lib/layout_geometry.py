@@ -0,0 +1,796 @@
+from typing import Dict, List, Optional, Tuple
+from xml.dom import minidom
+from dataclasses import dataclass, field
+import numpy as np
+from core.logger import logger
+from .constants import LAYOUT_SETTINGS
+
+BPMN_MODEL_NS = 'http://www.omg.org/spec/BPMN/20100524/MODEL'
+BPMN_DI_NS = 'http://www.omg.org/spec/BPMN/20100524/DI'
+DC_NS = 'http://www.omg.org/spec/DD/20100524/DC'
+DI_NS = 'http://www.omg.org/spec/DD/20100524/DI'
+
+# Shrink boxes by this much before edge tests so lines that only touch a border don't count
+EDGE_TOLERANCE = 0.5
+# Shapes that share a border up to rounding error are not overlapping
+OVERLAP_TOLERANCE = 1e-3
+# Grid cells grow so that no box spans more than this many cells along either axis
+GRID_MAX_CELLS = 256
+
+@dataclass
+class DiagramLayout:
+    """Diagram shape bounds and edge waypoints held as NumPy arrays.
+
+    ``bounds`` is an (n, 4) array of x, y, width, height per shape.
+    ``containers`` lists (ancestor, descendant) shape index pairs for shapes
+    drawn inside pools, lanes and sub processes. ``attachments`` lists
+    (host, boundary event) pairs. ``pools`` and ``lanes`` flag participant
+    and lane shapes, which frame other shapes rather than sit in the flow.
+    """
+    shape_ids: List[str]
+    bounds: np.ndarray
+    containers: np.ndarray
+    attachments: np.ndarray = field(default_factory=lambda: np.empty((0, 2), dtype=np.int64))
+    pools: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=bool))
+    lanes: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=bool))
+    edge_ids: List[str] = field(default_factory=list)
+    edge_endpoints: np.ndarray = field(default_factory=lambda: np.empty((0, 2), dtype=np.int64))
+    waypoints: List[np.ndarray] = field(default_factory=list)
+    shape_nodes: List[minidom.Element] = field(default_factory=list, repr=False)
+    edge_nodes: List[minidom.Element] = field(default_factory=list, repr=False)
+
+    def segments(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return an (m, 4) array of x0, y0, x1, y1 segments and the edge index of each."""
+        parts = [np.hstack([points[:-1], points[1:]]) for points in self.waypoints if len(points) > 1]
+        if not parts:
+            return np.empty((0, 4)), np.empty(0, dtype=np.int64)
+        counts = [len(points) - 1 for points in self.waypoints if len(points) > 1]
+        owners = [i for i, points in enumerate(self.waypoints) if len(points) > 1]
+        return np.vstack(parts), np.repeat(np.asarray(owners, dtype=np.int64), counts)
+
+    def exempt_pairs(self) -> np.ndarray:
+        """Shape pairs that overlap by design: containers, boundary events and lanes of a pool"""
+        lanes = np.flatnonzero(self.lanes)
+        lane_pairs = np.stack(np.meshgrid(lanes, lanes), axis=-1).reshape(-1, 2)
+        return np.concatenate([self.containers, self.attachments, lane_pairs[lane_pairs[:, 0] != lane_pairs[:, 1]]])
+
+def _local_name(node: minidom.Element) -> str:
+    return node.tagName.rpartition(':')[2]
+
+def _child_elements(node: minidom.Element, namespace: str, local_name: str) -> List[minidom.Element]:
+    return [
+        child for child in node.childNodes
+        if child.nodeType == child.ELEMENT_NODE
+        and child.namespaceURI == namespace
+        and _local_name(child) == local_name
+    ]
+
+def _index_elements(doc: minidom.Document) -> Dict[Tuple[str, str], List[minidom.Element]]:
+    """Group BPMN model and diagram elements by namespace and local name in one pass, in document order"""
+    elements = {}
+    stack = [doc.documentElement]
+    while stack:
+        node = stack.pop()
+        if node.namespaceURI in (BPMN_MODEL_NS, BPMN_DI_NS):
+            elements.setdefault((node.namespaceURI, _local_name(node)), []).append(node)
+        stack.extend(child for child in reversed(node.childNodes) if child.nodeType == child.ELEMENT_NODE)
+    return elements
+
+def _visual_parents(elements: Dict[Tuple[str, str], List[minidom.Element]]) -> Dict[str, str]:
+    """Map each element id to the pool, lane or sub process drawn directly around it"""
+    pools = {
+        participant.getAttribute('processRef'): participant.getAttribute('id')
+        for participant in elements.get((BPMN_MODEL_NS, 'participant'), [])
+        if participant.getAttribute('processRef')
+    }
+    parents = {}
+    for (namespace, _), nodes in elements.items():
+        if namespace != BPMN_MODEL_NS:
+            continue
+        for node in nodes:
+            element_id = node.getAttribute('id')
+            if not element_id:
+                continue
+            container = node.parentNode
+            while container.nodeType == container.ELEMENT_NODE and _local_name(container) not in ('process', 'subProcess', 'lane'):
+                container = container.parentNode
+            if container.nodeType != container.ELEMENT_NODE:
+                continue
+            if _local_name(container) != 'process':
+                parents[element_id] = container.getAttribute('id')
+            elif container.getAttribute('id') in pools:
+                parents[element_id] = pools[container.getAttribute('id')]
+
+    # Lanes list their flow nodes by reference, nested lanes come after their parent lane
+    lanes = elements.get((BPMN_MODEL_NS, 'lane'), [])
+    frame_ids = {lane.getAttribute('id') for lane in lanes} | set(pools.values())
+    for lane in lanes:
+        for reference in _child_elements(lane, BPMN_MODEL_NS, 'flowNodeRef'):
+            node_id = ''.join(child.data for child in reference.childNodes if child.nodeType == child.TEXT_NODE).strip()
+            if node_id not in parents or parents[node_id] in frame_ids:
+                parents[node_id] = lane.getAttribute('id')
+    return parents
+
+def _ancestor_pairs(parents: Dict[str, str], index: Dict[str, int]) -> List[Tuple[int, int]]:
+    """Expand direct parents into (ancestor, descendant) pairs of shapes"""
+    pairs = []
+    for element_id in parents:
+        if element_id not in index:
+            continue
+        ancestor, seen = parents[element_id], {element_id}
+        while ancestor and ancestor not in seen:
+            if ancestor in index:
+                pairs.append((index[ancestor], index[element_id]))
+            seen.add(ancestor)
+            ancestor = parents.get(ancestor)
+    return pairs
+
+def parse_diagram_layout(doc: minidom.Document) -> DiagramLayout:
+    """Collect shape bounds and edge waypoints from a parsed BPMN document"""
+    elements = _index_elements(doc)
+    shape_ids, rows, shape_nodes = [], [], []
+    for shape in elements.get((BPMN_DI_NS, 'BPMNShape'), []):
+        bounds = _child_elements(shape, DC_NS, 'Bounds')
+        if not bounds:
+            continue
+        shape_ids.append(shape.getAttribute('bpmnElement'))
+        rows.append([float(bounds[0].getAttribute(attr) or 0) for attr in ('x', 'y', 'width', 'height')])
+        shape_nodes.append(shape)
+
+    index = {element_id: i for i, element_id in enumerate(shape_ids)}
+    containers = _ancestor_pairs(_visual_parents(elements), index)
+    attachments = [
+        (index[event.getAttribute('attachedToRef')], index[event.getAttribute('id')])
+        for event in elements.get((BPMN_MODEL_NS, 'boundaryEvent'), [])
+        if event.getAttribute('attachedToRef') in index and event.getAttribute('id') in index
+    ]
+    pool_ids = {pool.getAttribute('id') for pool in elements.get((BPMN_MODEL_NS, 'participant'), [])}
+    lane_ids = {lane.getAttribute('id') for lane in elements.get((BPMN_MODEL_NS, 'lane'), [])}
+
+    # Sequence flows, message flows and associations all name their ends this way
+    flows = {
+        flow.getAttribute('id'): (flow.getAttribute('sourceRef'), flow.getAttribute('targetRef'))
+        for (namespace, _), nodes in elements.items() if namespace == BPMN_MODEL_NS
+        for flow in nodes if flow.hasAttribute('sourceRef') and flow.hasAttribute('targetRef')
+    }
+    edge_ids, endpoints, waypoints, edge_nodes = [], [], [], []
+    for edge in elements.get((BPMN_DI_NS, 'BPMNEdge'), []):
+        edge_id = edge.getAttribute('bpmnElement')
+        source, target = flows.get(edge_id, (None, None))
+        points = [
+            [float(point.getAttribute('x') or 0), float(point.getAttribute('y') or 0)]
+            for point in _child_elements(edge, DI_NS, 'waypoint')
+        ]
+        edge_ids.append(edge_id)
+        endpoints.append([index.get(source, -1), index.get(target, -1)])
+        waypoints.append(np.asarray(points, dtype=float).reshape(-1, 2))
+        edge_nodes.append(edge)
+
+    return DiagramLayout(
+        shape_ids=shape_ids,
+        bounds=np.asarray(rows, dtype=float).reshape(-1, 4),
+        containers=np.asarray(containers, dtype=np.int64).reshape(-1, 2),
+        attachments=np.asarray(attachments, dtype=np.int64).reshape(-1, 2),
+        pools=np.array([element_id in pool_ids for element_id in shape_ids], dtype=bool),
+        lanes=np.array([element_id in lane_ids for element_id in shape_ids], dtype=bool),
+        edge_ids=edge_ids,
+        edge_endpoints=np.asarray(endpoints, dtype=np.int64).reshape(-1, 2),
+        waypoints=waypoints,
+        shape_nodes=shape_nodes,
+        edge_nodes=edge_nodes
+    )
+
+def _expand_ranges(starts: np.ndarray, stops: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Expand per-query [starts, stops) ranges into flat (query, position) pairs"""
+    counts = np.clip(stops - starts, 0, None)
+    total = int(counts.sum())
+    queries = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return queries, np.repeat(starts, counts) + offsets
+
+def _grid_cells(boxes: np.ndarray, origin: np.ndarray, cell: float) -> Tuple[np.ndarray, np.ndarray]:
+    """List every grid cell each x0, y0, x1, y1 box covers as (box index, cell column and row)"""
+    low = np.floor((boxes[:, :2] - origin) / cell).astype(np.int64)
+    high = np.floor((boxes[:, 2:] - origin) / cell).astype(np.int64)
+    span = np.clip(high - low + 1, 0, None)
+    items, offsets = _expand_ranges(np.zeros(len(boxes), dtype=np.int64), span[:, 0] * span[:, 1])
+    cells = low[items] + np.stack([offsets % span[items, 0], offsets // span[items, 0]], axis=1)
+    return items, cells
+
+def _grid_candidates(first: np.ndarray, second: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Find index pairs of first and second x0, y0, x1, y1 boxes whose bounding boxes may meet.
+
+    Both sets are binned into a uniform grid sized to a typical box in
+    ``second``. Each pair is reported once, from the cell holding the
+    top-left corner of the area the two boxes share. Without ``second`` the
+    boxes are paired with each other, lower index first.
+    """
+    both = first if second is None else np.concatenate([first, second])
+    reference = first if second is None else second
+    origin = both[:, :2].min(axis=0)
+    extent = float((both[:, 2:].max(axis=0) - origin).max())
+    cell = max(float(np.median(reference[:, 2:] - reference[:, :2])), extent / GRID_MAX_CELLS, 1.0)
+
+    first_items, first_cells = _grid_cells(first, origin, cell)
+    if second is None:
+        second, second_items, second_cells = first, first_items, first_cells
+    else:
+        second_items, second_cells = _grid_cells(second, origin, cell)
+    rows = int(max(first_cells[:, 1].max(initial=0), second_cells[:, 1].max(initial=0))) + 1
+    first_keys = first_cells[:, 0] * rows + first_cells[:, 1]
+    second_keys = second_cells[:, 0] * rows + second_cells[:, 1]
+
+    if second is first:
+        # Entries sorted by cell and box index only need pairing with the entries after them
+        order = np.lexsort((first_items, first_keys))
+        first_items, first_cells, first_keys = first_items[order], first_cells[order], first_keys[order]
+        second_items = first_items
+        starts = np.arange(1, len(first_keys) + 1)
+        stops = np.searchsorted(first_keys, first_keys, side='right')
+    else:
+        order = np.argsort(second_keys, kind='stable')
+        second_keys, second_items = second_keys[order], second_items[order]
+        starts = np.searchsorted(second_keys, first_keys, side='left')
+        stops = np.searchsorted(second_keys, first_keys, side='right')
+
+    entries, positions = _expand_ranges(starts, stops)
+    a, b = first_items[entries], second_items[positions]
+    corner = np.floor((np.maximum(first[a, :2], second[b, :2]) - origin) / cell)
+    keep = (corner == first_cells[entries]).all(axis=1)
+    return a[keep], b[keep]
+
+def _strip_candidates(strips: np.ndarray, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Find index pairs of x0, y0, x1, y1 strips and boxes where the box's left edge lies in the strip's x range.
+
+    Boxes are bucketed into rows by y and sorted by left edge, so a long
+    strip only visits the boxes it actually spans. Pairs must also share
+    a row, and each is reported from the row holding the top of the area
+    they share.
+    """
+    origin = min(strips[:, 1].min(initial=np.inf), boxes[:, 1].min(initial=np.inf))
+    left = min(strips[:, 0].min(initial=np.inf), boxes[:, 0].min(initial=np.inf))
+    span = max(strips[:, 2].max(initial=-np.inf), boxes[:, 2].max(initial=-np.inf)) - left + 1
+    extent = max(strips[:, 3].max(initial=-np.inf), boxes[:, 3].max(initial=-np.inf)) - origin
+    height = max(float(np.median(boxes[:, 3] - boxes[:, 1])), extent / GRID_MAX_CELLS, 1.0)
+
+    def rows(items: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        low = np.floor((items[:, 1] - origin) / height).astype(np.int64)
+        high = np.floor((items[:, 3] - origin) / height).astype(np.int64)
+        entries, offsets = _expand_ranges(np.zeros(len(items), dtype=np.int64), high - low + 1)
+        return entries, low[entries] + offsets
+
+    box_entries, box_rows = rows(boxes)
+    keys = box_rows * span + (boxes[box_entries, 0] - left)
+    order = np.argsort(keys, kind='stable')
+    keys, box_entries = keys[order], box_entries[order]
+
+    strip_entries, strip_rows = rows(strips)
+    starts = np.searchsorted(keys, strip_rows * span + (strips[strip_entries, 0] - left), side='left')
+    stops = np.searchsorted(keys, strip_rows * span + (strips[strip_entries, 2] - left), side='left')
+    entries, positions = _expand_ranges(starts, stops)
+    a, b = strip_entries[entries], box_entries[positions]
+    top = np.floor((np.maximum(strips[a, 1], boxes[b, 1]) - origin) / height)
+    keep = top == strip_rows[entries]
+    return a[keep], b[keep]
+
+def _pair_mask(pairs: np.ndarray, exempt: np.ndarray, n: int) -> np.ndarray:
+    """True for pairs listed in exempt, in either order"""
+    if not len(exempt) or not len(pairs):
+        return np.zeros(len(pairs), dtype=bool)
+    listed = np.concatenate([exempt[:, 0] * n + exempt[:, 1], exempt[:, 1] * n + exempt[:, 0]])
+    return np.isin(pairs[:, 0] * n + pairs[:, 1], listed)
+
+def _boxes_overlap(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """True where x, y, width, height boxes share some area"""
+    return (
+        (first[:, 0] < second[:, 0] + second[:, 2] - OVERLAP_TOLERANCE)
+        & (second[:, 0] < first[:, 0] + first[:, 2] - OVERLAP_TOLERANCE)
+        & (first[:, 1] < second[:, 1] + second[:, 3] - OVERLAP_TOLERANCE)
+        & (second[:, 1] < first[:, 1] + first[:, 3] - OVERLAP_TOLERANCE)
+    )
+
+def find_shape_overlaps(
+    bounds: np.ndarray,
+    gap: float = 0.0,
+    exempt: Optional[np.ndarray] = None,
+    frames: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Find overlapping shapes using a uniform grid index.
+
+    Each shape is grown by ``gap`` on its right and bottom edges, so shapes
+    closer than ``gap`` count as overlapping. Pairs listed in ``exempt`` are
+    skipped, and pairs involving a shape flagged in ``frames`` only count
+    when they truly overlap. Returns an (k, 2) array of shape index pairs,
+    sorted, with the leftmost shape of each pair first.
+    """
+    n = len(bounds)
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    x0, y0 = bounds[:, 0], bounds[:, 1]
+    boxes = np.column_stack([
+        x0,
+        y0,
+        x0 + bounds[:, 2] + gap - OVERLAP_TOLERANCE,
+        y0 + bounds[:, 3] + gap - OVERLAP_TOLERANCE
+    ])
+    first, second = _grid_candidates(boxes)
+    hits = (boxes[first, 0] < boxes[second, 2]) & (boxes[second, 0] < boxes[first, 2])
+    hits &= (boxes[first, 1] < boxes[second, 3]) & (boxes[second, 1] < boxes[first, 3])
+    first, second = first[hits], second[hits]
+
+    swap = (x0[second] < x0[first]) | ((x0[second] == x0[first]) & (second < first))
+    pairs = np.stack([np.where(swap, second, first), np.where(swap, first, second)], axis=1)
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    if frames is not None and gap > 0:
+        framed = frames[pairs].any(axis=1)
+        touching = np.zeros(len(pairs), dtype=bool)
+        touching[framed] = ~_boxes_overlap(bounds[pairs[framed, 0]], bounds[pairs[framed, 1]])
+        pairs = pairs[~touching]
+    if exempt is not None:
+        pairs = pairs[~_pair_mask(pairs, exempt, n)]
+    return pairs
+
+def _segments_cross_boxes(segments: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """Vectorised Liang-Barsky test of segments against x0, y0, x1, y1 boxes"""
+    px, py = segments[:, 0], segments[:, 1]
+    dx, dy = segments[:, 2] - px, segments[:, 3] - py
+    p = np.stack([-dx, dx, -dy, dy], axis=1)
+    q = np.stack([px - boxes[:, 0], boxes[:, 2] - px, py - boxes[:, 1], boxes[:, 3] - py], axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = q / p
+    parallel_outside = ((p == 0) & (q < 0)).any(axis=1)
+    enter = np.where(p < 0, ratio, -np.inf).max(axis=1)
+    leave = np.where(p > 0, ratio, np.inf).min(axis=1)
+    return ~parallel_outside & (np.maximum(enter, 0.0) < np.minimum(leave, 1.0))
+
+def find_edge_intersections(layout: DiagramLayout) -> np.ndarray:
+    """Find edges passing through shapes other than their own source and target.
+
+    Shapes that contain or are attached to either end are skipped, as are
+    lanes, which edges cross freely. Returns an (k, 2) array of unique
+    (edge index, shape index) pairs.
+    """
+    segments, owners = layout.segments()
+    candidates = np.flatnonzero(~layout.lanes) if len(layout.lanes) else np.arange(len(layout.bounds))
+    if not len(segments) or not len(candidates):
+        return np.empty((0, 2), dtype=np.int64)
+
+    bounds = layout.bounds[candidates]
+    boxes = np.column_stack([
+        bounds[:, 0] + EDGE_TOLERANCE,
+        bounds[:, 1] + EDGE_TOLERANCE,
+        bounds[:, 0] + bounds[:, 2] - EDGE_TOLERANCE,
+        bounds[:, 1] + bounds[:, 3] - EDGE_TOLERANCE
+    ])
+    segment_boxes = np.column_stack([
+        np.minimum(segments[:, 0], segments[:, 2]),
+        np.minimum(segments[:, 1], segments[:, 3]),
+        np.maximum(segments[:, 0], segments[:, 2]),
+        np.maximum(segments[:, 1], segments[:, 3])
+    ])
+    queries, shapes = _grid_candidates(segment_boxes, boxes)
+
+    edges = owners[queries]
+    endpoints = layout.edge_endpoints[edges]
+    targets = candidates[shapes]
+    related = np.concatenate([layout.containers, layout.attachments])
+    keep = (targets != endpoints[:, 0]) & (targets != endpoints[:, 1])
+    keep &= ~_pair_mask(np.stack([endpoints[:, 0], targets], axis=1), related, len(layout.bounds))
+    keep &= ~_pair_mask(np.stack([endpoints[:, 1], targets], axis=1), related, len(layout.bounds))
+    queries, shapes, edges = queries[keep], shapes[keep], edges[keep]
+
+    crossing = _segments_cross_boxes(segments[queries], boxes[shapes])
+    return np.unique(np.stack([edges[crossing], candidates[shapes[crossing]]], axis=1), axis=0)
+
+def _band_labels(bounds: np.ndarray, gap: float) -> np.ndarray:
+    """Split shapes into horizontal bands whose y ranges never come within ``gap`` of each other"""
+    y0, h = bounds[:, 1], bounds[:, 3]
+    y_order = np.argsort(y0, kind='stable')
+    reach = np.maximum.accumulate(y0[y_order] + h[y_order] + gap)
+    band = np.empty(len(bounds), dtype=np.int64)
+    band[y_order] = np.cumsum(np.r_[0, y0[y_order][1:] >= reach[:-1]])
+    return band
+
+def _sweep_rows(bounds: np.ndarray, band: np.ndarray, gap: float) -> np.ndarray:
+    """Return new x positions for bands in which every shape shares a y range with every other.
+
+    Each shape must then start at least ``gap`` after the one before it in
+    its band, which unrolls into a running maximum.
+    """
+    n = len(bounds)
+    x0, w = bounds[:, 0], bounds[:, 2]
+    order = np.lexsort((np.arange(n), x0, band))
+    step = w[order] + gap
+    offset = np.cumsum(step) - step
+    slack = x0[order] - offset
+    # Lift each band above the previous one so the running maximum restarts per band
+    lift = (slack.max() - slack.min() + 1) * band[order]
+    slack = np.maximum.accumulate(slack + lift) - lift
+
+    positions = np.empty(n)
+    positions[order] = offset + slack
+    # Shapes that did not need to move keep their exact coordinates
+    return np.maximum(positions, x0)
+
+def _conflict_pairs(
+    bounds: np.ndarray,
+    positions: np.ndarray,
+    shapes: np.ndarray,
+    low: np.ndarray,
+    high: np.ndarray,
+    gap: float,
+    exempt: np.ndarray,
+    frames: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Pair ``shapes`` with the later shapes sharing their y range that start between ``low`` and ``high``.
+
+    Later means further right originally, an order pushing never changes
+    between shapes sharing a y range. Returns the earlier and later shape
+    of each pair.
+    """
+    n = len(bounds)
+    x0, y0, w, h = bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]
+    strips = np.column_stack([
+        low,
+        y0[shapes],
+        high,
+        y0[shapes] + h[shapes] + gap - OVERLAP_TOLERANCE
+    ])
+    boxes = np.column_stack([positions, y0, positions, y0 + h + gap - OVERLAP_TOLERANCE])
+    queries, second = _strip_candidates(strips, boxes)
+    first = shapes[queries]
+
+    pair_gap = np.where(frames[first] | frames[second], 0.0, gap)
+    keep = (x0[first] < x0[second]) | ((x0[first] == x0[second]) & (first < second))
+    keep &= (y0[first] < y0[second] + h[second] + pair_gap - OVERLAP_TOLERANCE)
+    keep &= (y0[second] < y0[first] + h[first] + pair_gap - OVERLAP_TOLERANCE)
+    keep &= ~_pair_mask(np.stack([first, second], axis=1), exempt, n)
+    return first[keep], second[keep]
+
+def _settle(positions: np.ndarray, first: np.ndarray, second: np.ndarray, step: np.ndarray, offsets: np.ndarray) -> None:
+    """Push shapes along pairs sorted by ``first`` until ``second`` starts ``step`` after ``first`` in each.
+
+    A shape with a single pair pushing it is a link in a chain, and its
+    position is ``max(a, position of the chain head + b)``. Chains are
+    collapsed by pointer jumping, then heads are settled in dependency
+    order, each once every pair pushing it has been applied, taking their
+    whole chain with them. Updates ``positions`` in place.
+    """
+    n = len(positions)
+    waiting = np.bincount(second, minlength=n)
+    link = waiting == 1
+    links = np.flatnonzero(link[second])
+    root = np.arange(n)
+    a, b = positions.copy(), np.zeros(n)
+    root[second[links]] = first[links]
+    b[second[links]] = step[links]
+
+    jumping = np.flatnonzero(link & link[root])
+    while len(jumping):
+        hop = root[jumping]
+        a[jumping], b[jumping], root[jumping] = np.maximum(a[jumping], a[hop] + b[jumping]), b[jumping] + b[hop], root[hop]
+        jumping = jumping[link[root[jumping]]]
+
+    order = np.argsort(root, kind='stable')
+    chains = np.r_[0, np.cumsum(np.bincount(root, minlength=n))]
+    ready = np.flatnonzero((waiting == 0) & (chains[1:] > chains[:-1]))
+    while len(ready):
+        _, members = _expand_ranges(chains[ready], chains[ready + 1])
+        members = order[members]
+        positions[members] = np.maximum(a[members], positions[root[members]] + b[members])
+        _, edges = _expand_ranges(offsets[members], offsets[members + 1])
+        edges = edges[~link[second[edges]]]
+        targets = second[edges]
+        np.maximum.at(positions, targets, positions[first[edges]] + step[edges])
+        np.subtract.at(waiting, targets, 1)
+        ready = np.unique(targets[waiting[targets] == 0])
+
+def _push_apart(bounds: np.ndarray, gap: float, exempt: np.ndarray, frames: np.ndarray) -> np.ndarray:
+    """Return new x positions, pushing each shape only past the shapes it collides with.
+
+    Each shape is paired with the later shapes it could collide with
+    before it has to move ``reach`` to the right, up to its ``horizon``.
+    The first pairs are settled in dependency order. Shapes pushed past
+    their horizon look for new pairs beyond it with twice the reach, pushes
+    are followed along them from where they start, and this repeats until
+    no pushed shape finds one.
+    """
+    n = len(bounds)
+    x0, w = bounds[:, 0], bounds[:, 2]
+    positions = x0.copy()
+    reach = float(np.median(w)) + gap
+    horizon = x0 + w + gap + reach - OVERLAP_TOLERANCE
+    pairs = np.empty((0, 2), dtype=np.int64)
+    first, second = _conflict_pairs(bounds, positions, np.arange(n), x0, horizon, gap, exempt, frames)
+
+    settled = False
+    while len(first):
+        sources = np.unique(first)
+        # A pair found twice only costs a repeated comparison
+        pairs = np.concatenate([pairs, np.stack([first, second], axis=1)])
+        pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+        first, second = pairs[:, 0], pairs[:, 1]
+        step = w[first] + np.where(frames[first] | frames[second], 0.0, gap)
+        offsets = np.r_[0, np.cumsum(np.bincount(first, minlength=n))]
+
+        if not settled:
+            _settle(positions, first, second, step, offsets)
+            settled = True
+        else:
+            # Later pairs only disturb the shapes downstream of them
+            while len(sources):
+                _, edges = _expand_ranges(offsets[sources], offsets[sources + 1])
+                targets, limits = second[edges], positions[first[edges]] + step[edges]
+                pushed = limits > positions[targets] + OVERLAP_TOLERANCE
+                np.maximum.at(positions, targets[pushed], limits[pushed])
+                sources = np.unique(targets[pushed])
+
+        # Every later shape starting before a shape's horizon is already paired with it
+        moved = np.flatnonzero(positions + w + gap - OVERLAP_TOLERANCE > horizon)
+        reach *= 2
+        low = horizon[moved]
+        horizon[moved] = np.maximum(low, positions[moved] + w[moved] + gap + reach - OVERLAP_TOLERANCE)
+        first, second = _conflict_pairs(bounds, positions, moved, low, horizon[moved], gap, exempt, frames)
+    return positions
+
+def _compact_group(
+    bounds: np.ndarray,
+    gap: float,
+    pairs: np.ndarray,
+    exempt: np.ndarray,
+    frames: Optional[np.ndarray]
+) -> np.ndarray:
+    """Return new x positions for sibling shapes with no overlaps left.
+
+    ``pairs`` are the overlaps found among the siblings. Only bands holding
+    one are touched, and within them a shape only moves when it is pushed
+    into by a shape on its left. Bands that form a single row are swept in
+    one vectorised pass, the rest are pushed apart together in a few
+    vectorised passes that honour exempt pairs and frames.
+    """
+    n = len(bounds)
+    frames = np.zeros(n, dtype=bool) if frames is None else frames
+    positions = bounds[:, 0].copy()
+    band = _band_labels(bounds, gap)
+    bands = band.max() + 1
+    busy = np.zeros(bands, dtype=bool)
+    busy[band[pairs[:, 0]]] = True
+
+    # In 1D, ranges that pairwise intersect share a common point
+    top = np.full(bands, -np.inf)
+    bottom = np.full(bands, np.inf)
+    np.maximum.at(top, band, bounds[:, 1])
+    np.minimum.at(bottom, band, bounds[:, 1] + bounds[:, 3] + gap)
+    special = np.zeros(bands, dtype=bool)
+    np.logical_or.at(special, band, frames)
+    special[band[exempt[:, 0]][band[exempt[:, 0]] == band[exempt[:, 1]]]] = True
+    row = (top < bottom - OVERLAP_TOLERANCE) & ~special
+
+    fast = (busy & row)[band]
+    if fast.any():
+        positions[fast] = _sweep_rows(bounds[fast], band[fast], gap)
+    slow = np.flatnonzero((busy & ~row)[band])
+    if len(slow):
+        positions[slow] = _push_apart(bounds[slow], gap, _local_pairs(exempt, slow, n), frames[slow])
+    return positions
+
+def _local_pairs(pairs: np.ndarray, members: np.ndarray, n: int) -> np.ndarray:
+    """Keep pairs between members, renumbered to their position in members"""
+    position = np.full(n, -1, dtype=np.int64)
+    position[members] = np.arange(len(members))
+    local = position[pairs]
+    return local[(local >= 0).all(axis=1)]
+
+def compact_shapes(
+    bounds: np.ndarray,
+    gap: float,
+    containers: Optional[np.ndarray] = None,
+    attachments: Optional[np.ndarray] = None,
+    exempt: Optional[np.ndarray] = None,
+    frames: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Push overlapping shapes right until every pair is at least ``gap`` apart.
+
+    Sibling shapes are compacted together, innermost containers first, so
+    each pool, lane or sub process is widened to fit its children before it
+    is placed, and the growth carries up to every container around it.
+    Nested shapes move along with their container and boundary events with
+    their host. Pairs in ``exempt`` are allowed to overlap and default to
+    the containers and attachments. Shapes flagged in ``frames`` only need
+    to clear true overlaps, and sibling frames such as the lanes of a pool
+    are stretched to a common right edge. Shapes only ever move right, so
+    the left-to-right flow stays intact.
+    """
+    bounds = bounds.copy()
+    n = len(bounds)
+    containers = np.empty((0, 2), dtype=np.int64) if containers is None else np.asarray(containers).reshape(-1, 2)
+    attachments = np.empty((0, 2), dtype=np.int64) if attachments is None else np.asarray(attachments).reshape(-1, 2)
+    if exempt is None:
+        exempt = np.concatenate([containers, attachments])
+
+    # The deepest container of each shape is its parent
+    depth = np.bincount(containers[:, 1], minlength=n)
+    parent = np.full(n, -1, dtype=np.int64)
+    ranked = containers[np.lexsort((depth[containers[:, 0]], containers[:, 1]))]
+    last = np.r_[ranked[1:, 1] != ranked[:-1, 1], True] if len(ranked) else np.empty(0, dtype=bool)
+    parent[ranked[last, 1]] = ranked[last, 0]
+
+    attached = np.zeros(n, dtype=bool)
+    attached[attachments[:, 1]] = True
+
+    frames = np.zeros(n, dtype=bool) if frames is None else frames
+    original = bounds.copy()
+    groups = sorted(np.unique(parent), key=lambda p: -depth[p] if p >= 0 else 1)
+    # Every round moves some shape right, so the loop only guards against pathological input
+    for _ in range(n):
+        for group_parent in groups:
+            members = np.flatnonzero((parent == group_parent) & ~attached)
+            group_exempt = _local_pairs(exempt, members, n)
+            pairs = find_shape_overlaps(bounds[members], gap, group_exempt, frames[members])
+            if len(pairs):
+                shift = np.zeros(n)
+                shift[members] = _compact_group(bounds[members], gap, pairs, group_exempt, frames[members]) - bounds[members, 0]
+                _carry(bounds, shift, containers, attachments)
+
+            if group_parent >= 0:
+                _fit_parent(bounds, original, members, group_parent, gap, frames)
+
+        shift = _cross_shifts(bounds, gap, containers, attachments, exempt, frames)
+        if not shift.any():
+            break
+        _carry(bounds, shift, containers, attachments)
+
+    return bounds
+
+def _carry(bounds: np.ndarray, shift: np.ndarray, containers: np.ndarray, attachments: np.ndarray) -> None:
+    """Move shapes right by ``shift``, taking nested shapes and boundary events along"""
+    total = shift.copy()
+    np.maximum.at(total, containers[:, 1], shift[containers[:, 0]])
+    np.maximum.at(total, attachments[:, 1], total[attachments[:, 0]])
+    bounds[:, 0] += total
+
+def _cross_shifts(
+    bounds: np.ndarray,
+    gap: float,
+    containers: np.ndarray,
+    attachments: np.ndarray,
+    exempt: np.ndarray,
+    frames: np.ndarray
+) -> np.ndarray:
+    """Return how far to push shapes that still overlap a shape in another container.
+
+    Such pairs are left over once each sibling group is compacted, for
+    example when a task hangs out of its lane into the next one, or a
+    boundary event sticks out of its host. The right shape of each pair is
+    pushed clear of the left one, a boundary event by way of its host.
+    Frames are left alone, and pairs that pushing cannot separate, such as
+    two events on one host, are skipped.
+    """
+    n = len(bounds)
+    pairs = find_shape_overlaps(bounds, gap, exempt, frames)
+    pairs = pairs[~frames[pairs].any(axis=1)]
+    host = np.arange(n)
+    host[attachments[:, 1]] = attachments[:, 0]
+    movers = host[pairs]
+    keep = (movers[:, 0] != movers[:, 1]) & ~_pair_mask(movers, containers, n)
+    pairs, movers = pairs[keep], movers[keep]
+
+    shift = np.zeros(n)
+    needed = bounds[pairs[:, 0], 0] + bounds[pairs[:, 0], 2] + gap - bounds[pairs[:, 1], 0]
+    np.maximum.at(shift, movers[:, 1], needed)
+    return shift
+
+def _fit_parent(bounds: np.ndarray, original: np.ndarray, members: np.ndarray, parent: int, gap: float, frames: np.ndarray) -> None:
+    """Widen ``parent`` to fit the members that now reach further right within it than they did.
+
+    When a lane grows its sibling lanes are stretched to the same right
+    edge, and frames need no gap to the parent's border. Runs for every
+    container, innermost first, so growth carries up the whole chain of
+    ancestors. Updates ``bounds`` in place.
+    """
+    def reach(boxes: np.ndarray) -> np.ndarray:
+        return boxes[members, 0] + boxes[members, 2] - boxes[parent, 0]
+
+    grown = reach(bounds) > reach(original) + OVERLAP_TOLERANCE
+    lanes = frames[members]
+    if (grown & lanes).any():
+        right = (bounds[members[lanes], 0] + bounds[members[lanes], 2]).max()
+        bounds[members[lanes], 2] = right - bounds[members[lanes], 0]
+        grown |= lanes & (reach(bounds) > reach(original) + OVERLAP_TOLERANCE)
+    if not grown.any():
+        return
+    needed = (reach(bounds) + np.where(lanes, 0.0, gap))[grown].max()
+    bounds[parent, 2] = max(bounds[parent, 2], needed)
+
+def _waypoint_shifts(points: np.ndarray, owners: np.ndarray, source_shift: np.ndarray, target_shift: np.ndarray) -> np.ndarray:
+    """Spread the x shifts of each edge's ends over its waypoints.
+
+    ``points`` holds the waypoints of all edges back to back, with the edge
+    of each in ``owners``. Consecutive waypoints of an edge sharing an x
+    coordinate form a vertical run and shift together, so orthogonal routes
+    stay orthogonal. Runs nearer the source follow the source, runs nearer
+    the target follow the target and a middle run splits the difference.
+    """
+    starts = np.r_[True, owners[1:] != owners[:-1]]
+    run = np.cumsum(starts | np.r_[True, points[1:, 0] != points[:-1, 0]])
+    run -= np.maximum.accumulate(np.where(starts, run, 0))
+    middle = np.zeros(owners.max(initial=-1) + 1)
+    np.maximum.at(middle, owners, run / 2)
+    middle = middle[owners]
+    source_shift, target_shift = source_shift[owners], target_shift[owners]
+    return np.where(run < middle, source_shift, np.where(run > middle, target_shift, (source_shift + target_shift) / 2))
+
+def _format_coordinate(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:g}"
+
+def _shift_label(node: minidom.Element, shift: float) -> None:
+    for label in _child_elements(node, BPMN_DI_NS, 'BPMNLabel'):
+        for bounds in _child_elements(label, DC_NS, 'Bounds'):
+            bounds.setAttribute('x', _format_coordinate(float(bounds.getAttribute('x') or 0) + shift))
+
+def _write_layout(layout: DiagramLayout, original: np.ndarray) -> None:
+    """Write moved shapes back into the document and shift the edges attached to them"""
+    shifts = layout.bounds[:, 0] - original[:, 0]
+    for i in np.flatnonzero((layout.bounds != original).any(axis=1)):
+        bounds = _child_elements(layout.shape_nodes[i], DC_NS, 'Bounds')[0]
+        bounds.setAttribute('x', _format_coordinate(layout.bounds[i, 0]))
+        bounds.setAttribute('width', _format_coordinate(layout.bounds[i, 2]))
+        _shift_label(layout.shape_nodes[i], shifts[i])
+
+    endpoints = layout.edge_endpoints
+    source_shift = np.where(endpoints[:, 0] >= 0, shifts[endpoints[:, 0]], 0.0)
+    target_shift = np.where(endpoints[:, 1] >= 0, shifts[endpoints[:, 1]], 0.0)
+    moving = np.flatnonzero((source_shift != 0) | (target_shift != 0))
+    moving = [i for i in moving if len(layout.waypoints[i])]
+    if not moving:
+        return
+    owners = np.repeat(moving, [len(layout.waypoints[i]) for i in moving])
+    points = np.concatenate([layout.waypoints[i] for i in moving])
+    points[:, 0] += _waypoint_shifts(points, owners, source_shift, target_shift)
+    for i, offset in zip(moving, np.cumsum([0] + [len(layout.waypoints[i]) for i in moving[:-1]])):
+        layout.waypoints[i] = points[offset:offset + len(layout.waypoints[i])]
+        for point, x in zip(_child_elements(layout.edge_nodes[i], DI_NS, 'waypoint'), layout.waypoints[i][:, 0]):
+            point.setAttribute('x', _format_coordinate(x))
+        _shift_label(layout.edge_nodes[i], (source_shift[i] + target_shift[i]) / 2)
+
+def resolve_layout_collisions(xml_str: str) -> str:
+    """Remove shape overlaps from BPMN XML and report edges crossing shapes.
+
+    XML that cannot be parsed or measured is returned unchanged, since layout
+    clean up should never fail an otherwise successful request.
+    """
+    try:
+        doc = minidom.parseString(xml_str)
+        layout = parse_diagram_layout(doc)
+        if not len(layout.bounds):
+            return xml_str
+
+        gap = LAYOUT_SETTINGS['min_element_gap']
+        exempt = layout.exempt_pairs()
+        frames = layout.pools | layout.lanes
+        overlaps = find_shape_overlaps(layout.bounds, gap, exempt, frames)
+        moved = False
+        if len(overlaps):
+            original = layout.bounds
+            layout.bounds = compact_shapes(layout.bounds, gap, layout.containers, layout.attachments, exempt, frames)
+            moved = not np.array_equal(layout.bounds, original)
+            if moved:
+                logger.debug(f"Resolved {len(overlaps)} overlapping shape pairs")
+                _write_layout(layout, original)
+            else:
+                logger.debug(f"Left {len(overlaps)} overlapping shape pairs that moving right cannot separate")
+
+        crossings = find_edge_intersections(layout)
+        if len(crossings):
+            listed = ", ".join(f"{layout.edge_ids[edge]} through {layout.shape_ids[shape]}" for edge, shape in crossings[:20])
+            logger.debug(f"{len(crossings)} edges pass through shapes: {listed}")
+
+        if not moved:
+            return xml_str
+        return doc.toxml(encoding="UTF-8").decode('utf-8')
+
+    except Exception as e:
+        logger.warning(f"Skipping layout collision check: {str(e)}")
+        return xml_str
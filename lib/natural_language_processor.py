@@ -1,10 +1,11 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from core.config import settings
 from core.logger import logger
+from .example_index import example_index, format_examples
 import json
 
-def build_system_prompt() -> str:
-    return """You are a BPMN process modeling expert. Convert natural language descriptions into structured process definitions.
+def build_system_prompt(examples: Optional[List[Dict[str, Any]]] = None) -> str:
+    system_prompt = """You are a BPMN process modeling expert. Convert natural language descriptions into structured process definitions.
     Output must be valid JSON only, no other text.
     The JSON must follow this structure:
     {
@@ -25,6 +26,13 @@ def build_system_prompt() -> str:
             }
         ]
     }"""
+    if examples:
+        examples_text = format_examples(examples).replace("\n", "\n    ")
+        system_prompt += f"""
+
+    Examples of previously accepted outputs:
+    {examples_text}"""
+    return system_prompt
 
 def process_text(prompt: str) -> Dict[str, Any]:
     """Process natural language input into structured format"""
@@ -32,10 +40,13 @@ def process_text(prompt: str) -> Dict[str, Any]:
         logger.debug("Processing text with NLP")
         logger.debug(f"Input prompt: {prompt}")
         
+        examples = example_index.search(prompt) if settings.EXAMPLE_INDEX_ENABLED else []
+        logger.debug(f"Retrieved {len(examples)} few-shot examples")
+        
         response = settings.openai_client.chat.completions.create(
             model="gpt-4",
             messages=[
-                {"role": "system", "content": build_system_prompt()},
+                {"role": "system", "content": build_system_prompt(examples)},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.2,
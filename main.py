@@ -1,5 +1,5 @@
 from fastapi import FastAPI
-from lib.bpmn_generator import router
+from lib.bpmn_generator import router, bpmn_service
 import uvicorn
 import logging
 
@@ -11,6 +11,10 @@ logging.basicConfig(
 app = FastAPI()
 app.include_router(router)
 
+@app.on_event("shutdown")
+def save_example_index():
+    bpmn_service.save_examples()
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
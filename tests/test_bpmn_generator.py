@@ -1,5 +1,7 @@
 from fastapi.testclient import TestClient
 from main import app
+from lib.bpmn_generator import ChatMessage, bpmn_service
+from lib.example_index import ExampleIndex
 
 client = TestClient(app)
 
@@ -25,3 +27,34 @@ def test_update_layout():
     )
     assert response.status_code == 200
     assert "bpmn_xml" in response.json()
+
+def test_confirm_example_uses_previous_prompt(monkeypatch):
+    index = ExampleIndex()
+    monkeypatch.setattr("lib.bpmn_generator.example_index", index)
+    index.propose("Approve the invoice", {})
+    history = [
+        ChatMessage(role="user", content="Approve the invoice"),
+        ChatMessage(role="assistant", content="<definitions/>")
+    ]
+    assert bpmn_service.confirm_example("Make it tidier", history)
+    assert len(index) == 1
+
+def test_confirm_example_skips_current_prompt_at_end_of_history(monkeypatch):
+    index = ExampleIndex()
+    monkeypatch.setattr("lib.bpmn_generator.example_index", index)
+    index.propose("Approve the invoice", {})
+    history = [
+        ChatMessage(role="user", content="Approve the invoice"),
+        ChatMessage(role="user", content="Make it tidier")
+    ]
+    assert bpmn_service.confirm_example("Make it tidier", history)
+
+def test_confirm_example_matches_existing_xml(monkeypatch):
+    # testall.sh sends only the current prompt as history, so the XML has to identify the generation
+    index = ExampleIndex()
+    monkeypatch.setattr("lib.bpmn_generator.example_index", index)
+    index.propose("Approve the invoice", {}, "<definitions/>")
+    history = [ChatMessage(role="user", content="Make it tidier")]
+    assert not bpmn_service.confirm_example("Make it tidier", history)
+    assert bpmn_service.confirm_example("Make it tidier", history, "<definitions/>\n")
+    assert len(index) == 1
@@ -0,0 +1,96 @@
+import pytest
+from lib.example_index import ExampleIndex, format_examples
+
+INTERMEDIARY = {
+    "process_id": "Process_1",
+    "process_name": "Order Fulfilment",
+    "elements": [
+        {"id": "StartEvent_1", "type": "start_event", "name": "Order Received"},
+        {"id": "EndEvent_1", "type": "end_event", "name": "Order Shipped"}
+    ],
+    "sequence_flows": [
+        {"id": "Flow_1", "sourceRef": "StartEvent_1", "targetRef": "EndEvent_1"}
+    ]
+}
+
+def test_search_returns_closest_examples():
+    index = ExampleIndex()
+    index.add("Receive the order, pick items, pack and ship the order", INTERMEDIARY)
+    index.add("Screen the job applicant then schedule an interview", INTERMEDIARY)
+    index.add("Review the invoice and approve or reject the payment", INTERMEDIARY)
+
+    results = index.search("Pack and ship the customer order", k=2)
+    assert results[0]["prompt"] == "Receive the order, pick items, pack and ship the order"
+    assert all(result["score"] >= 0.2 for result in results)
+    assert index.search("completely unrelated words", k=2) == []
+
+def test_add_skips_duplicate_prompts():
+    index = ExampleIndex()
+    assert index.add("Approve the invoice", INTERMEDIARY)
+    assert not index.add("Approve the invoice", INTERMEDIARY)
+    assert len(index) == 1
+
+def test_only_confirmed_examples_are_indexed():
+    index = ExampleIndex()
+    index.propose("Approve the invoice", INTERMEDIARY)
+    assert len(index) == 0
+    assert not index.confirm("Reject the invoice")
+    assert index.confirm("Approve the invoice")
+    assert not index.confirm("Approve the invoice")
+    assert len(index) == 1
+
+def test_proposals_are_found_by_their_output():
+    index = ExampleIndex()
+    index.propose("Approve the invoice", INTERMEDIARY, "<definitions/>")
+    assert index.proposed_prompt("<definitions/>\n") == "Approve the invoice"
+    assert index.proposed_prompt("<other/>") is None
+
+def test_oldest_examples_are_evicted():
+    index = ExampleIndex(max_size=2)
+    index.add("Receive the order and ship it", INTERMEDIARY)
+    index.add("Screen the job applicant", INTERMEDIARY)
+    index.add("Approve the invoice", INTERMEDIARY)
+    assert [example["prompt"] for example in index.examples] == ["Screen the job applicant", "Approve the invoice"]
+    assert index.search("ship the order") == []
+    assert index.search("approve invoice")[0]["prompt"] == "Approve the invoice"
+    assert index.add("Receive the order and ship it", INTERMEDIARY)
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "index" / "examples.json")
+    index = ExampleIndex(path)
+    index.add("Approve the invoice", INTERMEDIARY)
+    index.save()
+
+    loaded = ExampleIndex.load(path)
+    assert len(loaded) == 1
+    assert loaded.search("approve invoice")[0]["intermediary"] == INTERMEDIARY
+    assert len(ExampleIndex.load(str(tmp_path / "missing.json"))) == 0
+
+def test_index_reads_its_file_on_first_use(tmp_path):
+    path = str(tmp_path / "examples.json")
+    index = ExampleIndex(path)
+    with open(path, "w") as f:
+        f.write('[{"prompt": "Approve the invoice", "intermediary": {}}]')
+    assert not index.add("Approve the invoice", INTERMEDIARY)
+    assert len(index) == 1
+
+def test_failed_save_keeps_examples_unsaved(tmp_path):
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+    index = ExampleIndex(str(blocker / "examples.json"))
+    index.add("Approve the invoice", INTERMEDIARY)
+    with pytest.raises(OSError):
+        index.save()
+    assert index.dirty
+
+    index.save(str(tmp_path / "examples.json"))
+    assert not index.dirty
+
+def test_save_without_path_raises():
+    with pytest.raises(ValueError):
+        ExampleIndex().save()
+
+def test_format_examples_is_compact():
+    text = format_examples([{"prompt": "Approve the invoice", "intermediary": INTERMEDIARY}])
+    assert text.startswith("Description: Approve the invoice\nOutput: {")
+    assert ": " not in text.split("Output: ")[1]
@@ -0,0 +1,222 @@
+import time
+import numpy as np
+from xml.dom import minidom
+from lib.layout_geometry import (
+    compact_shapes,
+    find_edge_intersections,
+    find_shape_overlaps,
+    parse_diagram_layout,
+    resolve_layout_collisions
+)
+
+def _diagram(shapes: str, edges: str = "", flows: str = "", collaboration: str = "") -> str:
+    return (
+        '<bpmn:definitions xmlns:bpmn="http://www.omg.org/spec/BPMN/20100524/MODEL" '
+        'xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI" '
+        'xmlns:dc="http://www.omg.org/spec/DD/20100524/DC" '
+        'xmlns:di="http://www.omg.org/spec/DD/20100524/DI">'
+        f'{collaboration}<bpmn:process id="Process_1">{flows}</bpmn:process>'
+        '<bpmndi:BPMNDiagram id="BPMNDiagram_1"><bpmndi:BPMNPlane id="BPMNPlane_1" bpmnElement="Process_1">'
+        f'{shapes}{edges}'
+        '</bpmndi:BPMNPlane></bpmndi:BPMNDiagram></bpmn:definitions>'
+    )
+
+def _shape(element_id: str, x: int, y: int, width: int = 100, height: int = 80) -> str:
+    return (
+        f'<bpmndi:BPMNShape id="{element_id}_di" bpmnElement="{element_id}">'
+        f'<dc:Bounds x="{x}" y="{y}" width="{width}" height="{height}"/></bpmndi:BPMNShape>'
+    )
+
+def test_find_shape_overlaps():
+    bounds = np.array([
+        [0, 0, 100, 80],
+        [50, 40, 100, 80],
+        [300, 0, 100, 80],
+        [50, 200, 100, 80]
+    ], dtype=float)
+    assert find_shape_overlaps(bounds).tolist() == [[0, 1]]
+    assert find_shape_overlaps(np.array([[0, 0, 100, 80], [110, 0, 100, 80]], dtype=float), gap=20).tolist() == [[0, 1]]
+
+def test_compact_shapes_removes_overlaps():
+    rng = np.random.default_rng(0)
+    bounds = np.column_stack([
+        rng.uniform(0, 5000, 2000),
+        rng.integers(0, 10, 2000) * 200.0,
+        np.full(2000, 100.0),
+        np.full(2000, 80.0)
+    ])
+    compacted = compact_shapes(bounds, gap=20)
+    assert len(find_shape_overlaps(compacted, gap=20)) == 0
+    assert np.all(compacted[:, 0] >= bounds[:, 0])
+    assert np.array_equal(compacted[:, 1:], bounds[:, 1:])
+
+def test_compact_shapes_scales_to_staggered_layouts():
+    rng = np.random.default_rng(0)
+    bounds = np.column_stack([
+        rng.uniform(0, 40000, 5000),
+        rng.uniform(0, 9000, 5000),
+        np.full(5000, 100.0),
+        np.full(5000, 80.0)
+    ])
+    elapsed = []
+    for _ in range(3):
+        start = time.perf_counter()
+        compacted = compact_shapes(bounds, gap=20)
+        elapsed.append(time.perf_counter() - start)
+    assert len(find_shape_overlaps(compacted, gap=20)) == 0
+    assert np.all(compacted[:, 0] >= bounds[:, 0])
+    assert min(elapsed) < 0.2
+
+def test_compact_shapes_only_moves_overlapping_shapes():
+    bounds = np.array([
+        [0, 0, 100, 80],
+        [500, 90, 100, 80],
+        [0, 180, 100, 80],
+        [540, 90, 100, 80]
+    ], dtype=float)
+    compacted = compact_shapes(bounds, gap=20)
+    assert compacted[:, 0].tolist() == [0, 500, 0, 620]
+
+def test_find_edge_intersections_skips_endpoints():
+    xml_str = _diagram(
+        _shape("Task_1", 0, 0) + _shape("Task_2", 200, 0) + _shape("Task_3", 400, 0),
+        '<bpmndi:BPMNEdge id="Flow_1_di" bpmnElement="Flow_1">'
+        '<di:waypoint x="100" y="40"/><di:waypoint x="400" y="40"/></bpmndi:BPMNEdge>',
+        '<bpmn:sequenceFlow id="Flow_1" sourceRef="Task_1" targetRef="Task_3"/>'
+    )
+    layout = parse_diagram_layout(minidom.parseString(xml_str))
+    assert find_edge_intersections(layout).tolist() == [[0, 1]]
+
+def test_resolve_layout_collisions_moves_shapes_and_edges():
+    xml_str = _diagram(
+        _shape("Task_1", 0, 0) + _shape("Task_2", 50, 0),
+        '<bpmndi:BPMNEdge id="Flow_1_di" bpmnElement="Flow_1">'
+        '<di:waypoint x="100" y="40"/><di:waypoint x="50" y="40"/></bpmndi:BPMNEdge>',
+        '<bpmn:sequenceFlow id="Flow_1" sourceRef="Task_1" targetRef="Task_2"/>'
+    )
+    layout = parse_diagram_layout(minidom.parseString(resolve_layout_collisions(xml_str)))
+    assert layout.bounds[:, 0].tolist() == [0, 120]
+    assert layout.waypoints[0].tolist() == [[100, 40], [120, 40]]
+
+def test_resolve_layout_collisions_shifts_existing_waypoints():
+    xml_str = _diagram(
+        _shape("Task_1", 0, 0) + _shape("Task_2", 50, 0),
+        '<bpmndi:BPMNEdge id="Flow_1_di" bpmnElement="Flow_1">'
+        '<di:waypoint x="100" y="80"/><di:waypoint x="100" y="150"/>'
+        '<di:waypoint x="50" y="150"/><di:waypoint x="50" y="80"/></bpmndi:BPMNEdge>'
+        '<bpmndi:BPMNEdge id="Flow_2_di" bpmnElement="Flow_2">'
+        '<di:waypoint x="150" y="40"/><di:waypoint x="300" y="40"/></bpmndi:BPMNEdge>',
+        '<bpmn:sequenceFlow id="Flow_1" sourceRef="Task_2" targetRef="Task_1"/>',
+        '<bpmn:collaboration id="Collaboration_1">'
+        '<bpmn:messageFlow id="Flow_2" sourceRef="Task_2" targetRef="Participant_1"/></bpmn:collaboration>'
+    )
+    layout = parse_diagram_layout(minidom.parseString(resolve_layout_collisions(xml_str)))
+    assert layout.edge_endpoints.tolist() == [[1, 0], [1, -1]]
+    assert layout.waypoints[0].tolist() == [[170, 80], [170, 150], [50, 150], [50, 80]]
+    assert layout.waypoints[1].tolist() == [[220, 40], [300, 40]]
+
+def test_resolve_layout_collisions_ignores_nested_shapes():
+    xml_str = _diagram(
+        _shape("SubProcess_1", 0, 0, 400, 200) + _shape("Task_1", 50, 50),
+        flows='<bpmn:subProcess id="SubProcess_1"><bpmn:userTask id="Task_1"/></bpmn:subProcess>'
+    )
+    assert resolve_layout_collisions(xml_str) == xml_str
+
+def test_resolve_layout_collisions_keeps_tasks_inside_pools_and_lanes():
+    xml_str = _diagram(
+        _shape("Participant_1", 0, 0, 600, 250) + _shape("Lane_1", 30, 0, 570, 125)
+        + _shape("Lane_2", 30, 125, 570, 125) + _shape("Task_1", 100, 20) + _shape("Task_2", 300, 140),
+        flows=(
+            '<bpmn:laneSet id="LaneSet_1">'
+            '<bpmn:lane id="Lane_1"><bpmn:flowNodeRef>Task_1</bpmn:flowNodeRef></bpmn:lane>'
+            '<bpmn:lane id="Lane_2"><bpmn:flowNodeRef>Task_2</bpmn:flowNodeRef></bpmn:lane>'
+            '</bpmn:laneSet><bpmn:userTask id="Task_1"/><bpmn:userTask id="Task_2"/>'
+        ),
+        collaboration='<bpmn:collaboration id="Collaboration_1"><bpmn:participant id="Participant_1" processRef="Process_1"/></bpmn:collaboration>'
+    )
+    layout = parse_diagram_layout(minidom.parseString(xml_str))
+    assert sorted(layout.containers.tolist()) == [[0, 1], [0, 2], [0, 3], [0, 4], [1, 3], [2, 4]]
+    assert resolve_layout_collisions(xml_str) == xml_str
+
+def test_resolve_layout_collisions_widens_lanes_and_pool():
+    xml_str = _diagram(
+        _shape("Participant_1", 0, 0, 600, 250) + _shape("Lane_1", 30, 0, 570, 125)
+        + _shape("Lane_2", 30, 125, 570, 125) + _shape("Task_1", 450, 20) + _shape("Task_2", 480, 20),
+        flows=(
+            '<bpmn:laneSet id="LaneSet_1"><bpmn:lane id="Lane_1">'
+            '<bpmn:flowNodeRef>Task_1</bpmn:flowNodeRef><bpmn:flowNodeRef>Task_2</bpmn:flowNodeRef>'
+            '</bpmn:lane><bpmn:lane id="Lane_2"/></bpmn:laneSet>'
+            '<bpmn:userTask id="Task_1"/><bpmn:userTask id="Task_2"/>'
+        ),
+        collaboration='<bpmn:collaboration id="Collaboration_1"><bpmn:participant id="Participant_1" processRef="Process_1"/></bpmn:collaboration>'
+    )
+    layout = parse_diagram_layout(minidom.parseString(resolve_layout_collisions(xml_str)))
+    assert layout.bounds.tolist() == [
+        [0, 0, 690, 250],
+        [30, 0, 660, 125],
+        [30, 125, 660, 125],
+        [450, 20, 100, 80],
+        [570, 20, 100, 80]
+    ]
+
+def test_resolve_layout_collisions_separates_shapes_in_different_lanes():
+    xml_str = _diagram(
+        _shape("Participant_1", 0, 0, 600, 250) + _shape("Lane_1", 30, 0, 570, 125)
+        + _shape("Lane_2", 30, 125, 570, 125) + _shape("Task_1", 100, 100) + _shape("Task_2", 150, 140),
+        flows=(
+            '<bpmn:laneSet id="LaneSet_1">'
+            '<bpmn:lane id="Lane_1"><bpmn:flowNodeRef>Task_1</bpmn:flowNodeRef></bpmn:lane>'
+            '<bpmn:lane id="Lane_2"><bpmn:flowNodeRef>Task_2</bpmn:flowNodeRef></bpmn:lane>'
+            '</bpmn:laneSet><bpmn:userTask id="Task_1"/><bpmn:userTask id="Task_2"/>'
+        ),
+        collaboration='<bpmn:collaboration id="Collaboration_1"><bpmn:participant id="Participant_1" processRef="Process_1"/></bpmn:collaboration>'
+    )
+    layout = parse_diagram_layout(minidom.parseString(resolve_layout_collisions(xml_str)))
+    assert layout.bounds[:, 0].tolist() == [0, 30, 30, 100, 220]
+    assert layout.bounds[:3, 2].tolist() == [600, 570, 570]
+
+def test_resolve_layout_collisions_leaves_inseparable_shapes_untouched():
+    xml_str = _diagram(
+        _shape("Task_1", 0, 0) + _shape("BoundaryEvent_1", 82, 62, 36, 36) + _shape("BoundaryEvent_2", 82, 62, 36, 36),
+        flows=(
+            '<bpmn:userTask id="Task_1"/>'
+            '<bpmn:boundaryEvent id="BoundaryEvent_1" attachedToRef="Task_1"/>'
+            '<bpmn:boundaryEvent id="BoundaryEvent_2" attachedToRef="Task_1"/>'
+        )
+    )
+    assert resolve_layout_collisions(xml_str) == xml_str
+
+def test_resolve_layout_collisions_keeps_boundary_events_on_host():
+    xml_str = _diagram(
+        _shape("Task_1", 100, 100) + _shape("BoundaryEvent_1", 182, 162, 36, 36) + _shape("Task_2", 150, 100),
+        '<bpmndi:BPMNEdge id="Flow_1_di" bpmnElement="Flow_1">'
+        '<di:waypoint x="200" y="198"/><di:waypoint x="200" y="300"/></bpmndi:BPMNEdge>',
+        '<bpmn:userTask id="Task_1"/><bpmn:userTask id="Task_2"/>'
+        '<bpmn:boundaryEvent id="BoundaryEvent_1" attachedToRef="Task_1"/>'
+        '<bpmn:sequenceFlow id="Flow_1" sourceRef="BoundaryEvent_1" targetRef="Task_2"/>'
+    )
+    layout = parse_diagram_layout(minidom.parseString(xml_str))
+    assert layout.attachments.tolist() == [[0, 1]]
+    assert len(find_edge_intersections(layout)) == 0
+
+    layout = parse_diagram_layout(minidom.parseString(resolve_layout_collisions(xml_str)))
+    # Task_2 clears the boundary event as well as its host
+    assert layout.bounds[:, 0].tolist() == [100, 182, 238]
+
+def test_compact_shapes_widens_sub_process():
+    bounds = np.array([
+        [0, 0, 250, 200],
+        [20, 50, 100, 80],
+        [100, 50, 100, 80],
+        [260, 0, 100, 80]
+    ], dtype=float)
+    compacted = compact_shapes(bounds, gap=20, containers=np.array([[0, 1], [0, 2]]))
+    assert compacted[:, 0].tolist() == [0, 20, 140, 280]
+    assert compacted[0, 2] == 260
+
+def test_resolve_layout_collisions_passes_through_invalid_xml():
+    assert resolve_layout_collisions("not xml") == "not xml"
+
+def test_resolve_layout_collisions_passes_through_malformed_coordinates():
+    xml_str = _diagram(_shape("Task_1", 0, 0) + _shape("Task_2", "abc", 0))
+    assert resolve_layout_collisions(xml_str) == xml_str
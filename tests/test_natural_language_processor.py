@@ -0,0 +1,14 @@
+from lib.natural_language_processor import build_system_prompt
+
+def test_build_system_prompt_without_examples():
+    assert build_system_prompt() == build_system_prompt([])
+    assert "Examples of previously accepted outputs" not in build_system_prompt()
+
+def test_build_system_prompt_includes_examples():
+    system_prompt = build_system_prompt([{"prompt": "Approve the invoice", "intermediary": {"process_id": "Process_1"}}])
+    assert system_prompt.startswith(build_system_prompt())
+    assert system_prompt.endswith(
+        "Examples of previously accepted outputs:\n"
+        "    Description: Approve the invoice\n"
+        '    Output: {"process_id":"Process_1"}'
+    )